@@ -171,7 +171,7 @@ class VtsVndkAbiTest(base_test.BaseTestClass):
         lib_vtables = {vtable.name: vtable
                        for vtable in dumper.DumpVtables()}
         logging.debug("\n\n".join(str(vtable)
-                                  for _, vtable in lib_vtables.iteritems()))
+                                  for _, vtable in lib_vtables.items()))
 
         vtables_diff = []
         for record_type in dump_obj.get("record_types", []):
@@ -264,7 +264,7 @@ class VtsVndkAbiTest(base_test.BaseTestClass):
                 if lib_name not in lib_paths:
                     lib_paths[lib_name] = os.path.join(parent_dir, lib_name)
 
-        for lib_name, dump_path in dump_paths.iteritems():
+        for lib_name, dump_path in dump_paths.items():
             if lib_name not in lib_paths:
                 logging.info("%s: Not found on target", lib_name)
                 continue
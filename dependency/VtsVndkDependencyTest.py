@@ -47,7 +47,7 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
                    partitions are copied.
         _ll_ndk: Set of strings. The names of low-level NDK libraries in
                  /system/lib[64].
-        _sp_hal: List of patterns. The names of the same-process HAL libraries
+        _sp_hal: Compiled pattern. The names of the same-process HAL libraries
                  expected to be in /vendor/lib[64].
         _vndk: Set of strings. The names of VNDK-core libraries.
         _vndk_sp: Set of strings. The names of VNDK-SP libraries.
@@ -82,6 +82,8 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
             deps: List of strings. The names of the depended libraries.
             runpaths: List of strings. The library search paths.
         """
+        __slots__ = ("target_path", "name", "target_dir", "bitness", "deps",
+                     "runpaths")
 
         def __init__(self, target_path, bitness, deps, runpaths):
             self.target_path = target_path
@@ -122,8 +124,13 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
         asserts.assertTrue(vndk_lists, "Cannot load VNDK library lists.")
 
         sp_hal_strings = vndk_lists[0]
-        self._sp_hal = [re.compile(x) for x in sp_hal_strings]
-        (self._ll_ndk, self._vndk, self._vndk_sp) = vndk_lists[1:]
+        # An alternation matches all patterns in one call. "(?!)" matches
+        # nothing if the list is empty.
+        self._sp_hal = re.compile(
+            "|".join("(?:%s)" % x for x in sp_hal_strings) or "(?!)")
+        # The lists are converted to sets for fast membership tests.
+        (self._ll_ndk, self._vndk, self._vndk_sp) = (
+            frozenset(x) for x in vndk_lists[1:])
 
         logging.debug("LL_NDK: %s", self._ll_ndk)
         logging.debug("SP_HAL: %s", sp_hal_strings)
@@ -135,24 +142,22 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
         logging.info("Delete %s", self._temp_dir)
         shutil.rmtree(self._temp_dir)
 
-    def _IsElfObjectForAp(self, elf, target_path, abi_list):
+    def _IsElfObjectForAp(self, elf, target_path, is_executable):
         """Checks whether an ELF object is for application processor.
 
+        The caller checks the ABI before calling this method.
+
         Args:
             elf: The object of elf_parser.ElfParser.
             target_path: The path to the ELF file on target.
-            abi_list: A list of strings, the ABIs of the application processor.
+            is_executable: A boolean, whether the ELF type is executable.
 
         Returns:
             A boolean, whether the ELF object is for application processor.
         """
-        if not any(elf.MatchCpuAbi(x) for x in abi_list):
-            logging.debug("%s does not match the ABI", target_path)
-            return False
-
         # b/115567177 Skip an ELF file if it meets the following 3 conditions:
         # The ELF type is executable.
-        if not elf.IsExecutable():
+        if not is_executable:
             return True
 
         # It requires special program interpreter.
@@ -168,7 +173,7 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
 
         return False
 
-    def _IsElfObjectBuiltForAndroid(self, elf, target_path):
+    def _IsElfObjectBuiltForAndroid(self, elf, target_path, is_executable):
         """Checks whether an ELF object is built for Android.
 
         Some ELF objects in vendor partition require special program
@@ -180,6 +185,7 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
         Args:
             elf: The object of elf_parser.ElfParser.
             target_path: The path to the ELF file on target.
+            is_executable: A boolean, whether the ELF type is executable.
 
         Returns:
             A boolean, whether the ELF object is built for Android.
@@ -202,7 +208,7 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
             if interp and interp not in self._DEFAULT_PROGRAM_INTERPRETERS:
                 permissions = target_file_utils.GetPermission(target_path,
                                                               self._dut.shell)
-                if (elf.IsExecutable() or
+                if (is_executable or
                         target_file_utils.IsExecutable(permissions)):
                     return False
 
@@ -235,11 +241,21 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
                 logging.debug("%s is not an ELF file", target_path)
                 continue
             try:
-                if not self._IsElfObjectForAp(elf, target_path, abi_list):
+                if not any(elf.MatchCpuAbi(x) for x in abi_list):
+                    logging.debug("%s does not match the ABI", target_path)
                     logging.info("%s is not for application processor",
                                  target_path)
                     continue
-                if not self._IsElfObjectBuiltForAndroid(elf, target_path):
+                # Both checks use the ELF type. Read it after the ABI check,
+                # which rejects the files for other processors.
+                is_executable = elf.IsExecutable()
+                if not self._IsElfObjectForAp(elf, target_path,
+                                              is_executable):
+                    logging.info("%s is not for application processor",
+                                 target_path)
+                    continue
+                if not self._IsElfObjectBuiltForAndroid(elf, target_path,
+                                                        is_executable):
                     logging.info("%s is not built for Android", target_path)
                     continue
 
@@ -280,27 +296,53 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
                 namespace[obj.target_dir][obj.name] = obj
         return namespace
 
-    def _DfsDependencies(self, lib, searched, namespace, link_paths):
+    def _DfsDependencies(self, lib, searched, namespace, linkable_libs):
         """Depth-first-search for library dependencies.
 
         Args:
             lib: ElfObject, the library to search for dependencies.
             searched: The set of searched libraries.
             namespace: Defaultdict, {dir: {name: obj}} containing all
-                       searchable libraries.
+                       searchable libraries. It is used to resolve runpaths.
+            linkable_libs: Dict, {name: obj} returned by
+                           _ResolveLibsInLinkPaths.
+        """
+        stack = [lib]
+        while stack:
+            lib = stack.pop()
+            if lib in searched:
+                continue
+            searched.add(lib)
+            for dep_name in lib.deps:
+                dep = None
+                for runpath in lib.runpaths:
+                    dep = namespace.get(runpath, {}).get(dep_name)
+                    if dep is not None:
+                        break
+                else:
+                    dep = linkable_libs.get(dep_name)
+                if dep is not None and dep not in searched:
+                    stack.append(dep)
+
+    @staticmethod
+    def _ResolveLibsInLinkPaths(namespace, link_paths):
+        """Resolves library names in link paths.
+
+        Args:
+            namespace: Defaultdict, {dir: {name: obj}} containing all libraries
+                       in the linker namespace.
             link_paths: List of strings, the default link paths.
+
+        Returns:
+            A dict, {name: obj} where obj is the ElfObject found first in the
+            link paths.
         """
-        if lib in searched:
-            return
-        searched.add(lib)
-        for dep_name in lib.deps:
-            for link_path in lib.runpaths + link_paths:
-                if dep_name in namespace[link_path]:
-                    self._DfsDependencies(namespace[link_path][dep_name],
-                                          searched, namespace, link_paths)
-                    break
-
-    def _FindDisallowedDependencies(self, objs, namespace, link_paths,
+        linkable_libs = {}
+        for link_path in reversed(link_paths):
+            linkable_libs.update(namespace.get(link_path, {}))
+        return linkable_libs
+
+    def _FindDisallowedDependencies(self, objs, namespace, linkable_libs,
                                     *vndk_lists):
         """Tests if libraries/executables have disallowed dependencies.
 
@@ -308,8 +350,10 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
             objs: Collection of ElfObject, the libraries/executables under
                   test.
             namespace: Defaultdict, {dir: {name: obj}} containing all libraries
-                       in the linker namespace.
-            link_paths: List of strings, the default link paths.
+                       in the linker namespace. It is used to resolve the
+                       runpaths.
+            linkable_libs: Dict, {name: obj} returned by
+                           _ResolveLibsInLinkPaths.
             vndk_lists: Collections of library names in VNDK, VNDK-SP, etc.
 
         Returns:
@@ -321,8 +365,10 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
             for dep_name in obj.deps:
                 if any((dep_name in vndk_list) for vndk_list in vndk_lists):
                     continue
-                if any((dep_name in namespace[link_path]) for link_path in
-                       obj.runpaths + link_paths):
+                if dep_name in linkable_libs:
+                    continue
+                if any((dep_name in namespace.get(runpath, ())) for runpath in
+                       obj.runpaths):
                     continue
                 disallowed_libs.append(dep_name)
 
@@ -351,22 +397,26 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
         for vndk_ext_dir in (vndk_utils.GetVndkExtDirectories(bitness) +
                              vndk_utils.GetVndkSpExtDirectories(bitness)):
             vendor_namespace.pop(vndk_ext_dir, None)
+        vendor_linkable_libs = self._ResolveLibsInLinkPaths(
+            vendor_namespace, vendor_link_paths)
         logging.info("%d-bit odm, vendor, and SP-HAL libraries:", bitness)
-        for dir_path, libs in vendor_namespace.iteritems():
-            logging.info("%s: %s", dir_path, ",".join(libs.iterkeys()))
+        for dir_path, libs in vendor_namespace.items():
+            logging.info("%s: %s", dir_path, ",".join(libs.keys()))
 
         sp_hal_link_paths = [vndk_utils.FormatVndkPath(x, bitness) for
                              x in self._SP_HAL_LINK_PATHS]
         sp_hal_namespace = self._FindLibsInLinkPaths(bitness,
                                                      sp_hal_link_paths, objs)
+        sp_hal_linkable_libs = self._ResolveLibsInLinkPaths(
+            sp_hal_namespace, sp_hal_link_paths)
 
         # Find same-process HAL and dependencies
         sp_hal_libs = set()
         for link_path in sp_hal_link_paths:
-            for obj in sp_hal_namespace[link_path].itervalues():
-                if any(x.match(obj.target_path) for x in self._sp_hal):
+            for obj in sp_hal_namespace.get(link_path, {}).values():
+                if self._sp_hal.match(obj.target_path):
                     self._DfsDependencies(obj, sp_hal_libs, sp_hal_namespace,
-                                          sp_hal_link_paths)
+                                          sp_hal_linkable_libs)
         logging.info("%d-bit SP-HAL libraries: %s",
                      bitness, ", ".join(x.name for x in sp_hal_libs))
 
@@ -377,7 +427,7 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
         vndk_sp_ext_deps = set()
         for lib in vndk_sp_ext_libs:
             self._DfsDependencies(lib, vndk_sp_ext_deps, sp_hal_namespace,
-                                  sp_hal_link_paths)
+                                  sp_hal_linkable_libs)
         logging.info("%d-bit VNDK-SP extension libraries and dependencies: %s",
                      bitness, ", ".join(x.name for x in vndk_sp_ext_deps))
 
@@ -391,7 +441,7 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
                        obj not in sp_hal_libs and
                        obj not in vndk_sp_ext_deps}
         dep_errors = self._FindDisallowedDependencies(
-            vendor_objs, vendor_namespace, vendor_link_paths,
+            vendor_objs, vendor_namespace, vendor_linkable_libs,
             self._ll_ndk, self._vndk, self._vndk_sp)
 
         # A VNDK-SP extension library/dependency is allowed to depend on
@@ -407,7 +457,7 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
         # restrictions are the same.
         dep_errors.extend(self._FindDisallowedDependencies(
             vndk_sp_ext_deps - sp_hal_libs, vendor_namespace,
-            vendor_link_paths, self._ll_ndk, self._vndk_sp))
+            vendor_linkable_libs, self._ll_ndk, self._vndk_sp))
 
         if not vndk_utils.IsVndkRuntimeEnforced(self._dut):
             logging.warning("Ignore dependency errors: %s", dep_errors)
@@ -418,7 +468,7 @@ class VtsVndkDependencyTest(base_test.BaseTestClass):
         # VNDK-SP
         # Other same-process HAL libraries and dependencies
         dep_errors.extend(self._FindDisallowedDependencies(
-            sp_hal_libs, sp_hal_namespace, sp_hal_link_paths,
+            sp_hal_libs, sp_hal_namespace, sp_hal_linkable_libs,
             self._ll_ndk, self._vndk_sp))
         return dep_errors
 
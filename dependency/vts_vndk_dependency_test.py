@@ -18,6 +18,10 @@
 # TODO(b/147454897): Keep the test logic in sync with VtsVndkDependency.py
 #                    until it is removed.
 import collections
+import concurrent.futures
+import hashlib
+import itertools
+import json
 import logging
 import os
 import posixpath as target_path_module
@@ -32,6 +36,146 @@ from vts.testcases.vndk.golden import vndk_data
 from vts.utils.python.library import elf_parser
 from vts.utils.python.vndk import vndk_utils
 
+# The properties of an ELF file which the test reads from the host copy.
+#
+# Attributes:
+#     bitness: Integer. Bitness of the ELF.
+#     is_executable: Boolean, whether the ELF type is executable.
+#     is_shared_object: Boolean, whether the ELF type is shared object.
+#     interp: String. The program interpreter. Empty if none.
+#     has_android_ident: Boolean, whether the ELF has .note.android.ident.
+#     deps: List of strings. The names of the depended libraries.
+#     runpaths: List of strings. The library search paths.
+#     error: String. The error message if the parser fails to read the fields
+#            that are checked after _IsElfObjectForAp, i.e., all fields
+#            except bitness, is_executable, and interp of executables. None
+#            if the fields are read.
+#
+# is_shared_object and interp of non-executables are read only if
+# _IsElfObjectBuiltForAndroid checks them. Otherwise they are None.
+_ElfInfo = collections.namedtuple(
+    "_ElfInfo", ["bitness", "is_executable", "is_shared_object", "interp",
+                 "has_android_ident", "deps", "runpaths", "error"])
+
+
+_ELF_MAGIC = b"\x7fELF"
+
+# The compiled SP-HAL patterns shared among the test instances in the process.
+_sp_hal_pattern_cache = {}
+
+
+def _CompileSpHalPattern(sp_hal_strings):
+    """Compiles SP-HAL patterns into one regular expression.
+
+    The compiled expressions are cached so that the test cases running in the
+    same process do not compile the same patterns again.
+
+    Args:
+        sp_hal_strings: List of strings, the patterns of SP-HAL libraries.
+
+    Returns:
+        The compiled regular expression which matches any of the patterns.
+    """
+    key = tuple(sp_hal_strings)
+    pattern = _sp_hal_pattern_cache.get(key)
+    if pattern is None:
+        # An alternation matches all patterns in one call. "(?!)" matches
+        # nothing if the list is empty.
+        pattern = re.compile(
+            "|".join("(?:%s)" % x for x in sp_hal_strings) or "(?!)")
+        _sp_hal_pattern_cache[key] = pattern
+    return pattern
+
+
+def _ParallelMap(func, *iterables):
+    """Maps a function to iterables in a process pool.
+
+    If the platform does not support process pools, this function calls the
+    function in the current process.
+
+    Args:
+        func: The function to call. It must be picklable.
+        *iterables: The iterables of the arguments.
+
+    Yields:
+        The return values of the function in the order of the arguments.
+    """
+    try:
+        executor = concurrent.futures.ProcessPoolExecutor()
+    except (NotImplementedError, OSError) as e:
+        logging.warning("Cannot create process pool: %s", e)
+        for result in map(func, *iterables):
+            yield result
+        return
+    with executor:
+        for result in executor.map(func, *iterables, chunksize=32):
+            yield result
+
+
+def _ReadElfFile(full_path, target_path, abi_lists):
+    """Reads an ELF file on host.
+
+    This function runs in worker processes, so it must not access the
+    device.
+
+    Args:
+        full_path: The path to the ELF file on host.
+        target_path: The path to the ELF file on target.
+        abi_lists: A dict of {bitness: [abi]}, the ABIs of the ELF files to
+                   load.
+
+    Returns:
+        A tuple of (status, value).
+        ("not_elf", None) if the file is not an ELF file.
+        ("not_abi", None) if the ELF does not match the ABIs.
+        ("error", message) if the parser fails to read the fields required
+        by _IsElfObjectForAp.
+        ("ok", _ElfInfo) otherwise.
+    """
+    # Check the magic number before the parser reads the headers.
+    try:
+        with open(full_path, "rb") as elf_file:
+            if elf_file.read(len(_ELF_MAGIC)) != _ELF_MAGIC:
+                return "not_elf", None
+    except (IOError, OSError):
+        return "not_elf", None
+    try:
+        elf = elf_parser.ElfParser(full_path)
+    except elf_parser.ElfError:
+        return "not_elf", None
+    try:
+        # An ELF can only match the ABIs of the same bitness.
+        if not any(elf.MatchCpuAbi(x) for x in
+                   abi_lists.get(elf.bitness, ())):
+            return "not_abi", None
+        is_executable = elf.IsExecutable()
+        interp = elf.GetProgramInterpreter() if is_executable else None
+    except elf_parser.ElfError as e:
+        elf.Close()
+        return "error", str(e)
+    # _IsElfObjectForAp may skip the ELF without checking the other fields.
+    # Their errors are reported only if the ELF passes the check.
+    is_shared_object, has_android_ident, deps, runpaths = (None, ) * 4
+    try:
+        has_android_ident = elf.HasAndroidIdent()
+        # The fields are read under the same conditions as
+        # _IsElfObjectBuiltForAndroid.
+        if not has_android_ident:
+            if (target_path.startswith("/vendor/arib/lib/") and
+                    ".so" in target_path):
+                is_shared_object = elf.IsSharedObject()
+            if (target_path.startswith("/vendor/arib/bin/") and
+                    not is_executable):
+                interp = elf.GetProgramInterpreter()
+        deps, runpaths = elf.ListDependencies()
+        error = None
+    except elf_parser.ElfError as e:
+        error = str(e)
+    finally:
+        elf.Close()
+    return "ok", _ElfInfo(elf.bitness, is_executable, is_shared_object,
+                          interp, has_android_ident, deps, runpaths, error)
+
 
 class VtsVndkDependencyTest(unittest.TestCase):
     """A test case to verify vendor library dependency.
@@ -42,12 +186,41 @@ class VtsVndkDependencyTest(unittest.TestCase):
                    partitions are copied.
         _ll_ndk: Set of strings. The names of low-level NDK libraries in
                  /system/lib[64].
-        _sp_hal: List of patterns. The names of the same-process HAL libraries
+        _sp_hal: Compiled pattern. The names of the same-process HAL libraries
                  expected to be in /vendor/lib[64].
         _vndk: Set of strings. The names of VNDK-core libraries.
         _vndk_sp: Set of strings. The names of VNDK-SP libraries.
+        _abi_lists: Dict of {bitness: [abi]}. The ABIs of the ELF files to
+                    load.
+        _is_64_bit: Boolean, whether the device supports 64-bit ABIs.
+        _elf_futures: Dict of {host_path: future}. The ELF files being read
+                      in _executor.
+        _executor: The ProcessPoolExecutor that reads the ELF files while
+                   they are being pulled. None if it is disabled.
+        _vendor_allowed: Set of strings. The names of LL-NDK, VNDK, and
+                         VNDK-SP libraries, which vendor libraries are
+                         allowed to depend on.
+        _sp_hal_allowed: Set of strings. The names of LL-NDK and VNDK-SP
+                         libraries, which same-process HAL and VNDK-SP
+                         extensions are allowed to depend on.
+        _permissions: Dict of {path: permission}. The permissions of the
+                      files in odm and vendor partitions.
+        _sp_hal_link_paths: Dict of {bitness: [path]}. The link paths of
+                            same-process HAL.
+        _vendor_link_paths: Dict of {bitness: [path]}. The link paths of
+                            vendor processes.
+        _vndk_ext_dirs: Dict of {bitness: [path]}. The directories of VNDK
+                        extensions.
+        _vndk_sp_ext_dirs: Dict of {bitness: [path]}. The directories of
+                           VNDK-SP extensions.
         _SP_HAL_LINK_PATHS: Format strings of same-process HAL's link paths.
         _VENDOR_LINK_PATHS: Format strings of vendor processes' link paths.
+        _ELF_CACHE_ENV: The environment variable which specifies the path to
+                        the cache of ELF file properties. The cache is
+                        disabled if the variable is not set.
+        _ELF_CACHE_VERSION: The version of the cache format. It is increased
+                            when the format or the meaning of the cached
+                            _ElfInfo changes.
     """
     _TARGET_DIR_SEP = "/"
     _TARGET_ROOT_DIR = "/"
@@ -62,9 +235,11 @@ class VtsVndkDependencyTest(unittest.TestCase):
         "/odm/{LIB}/hw", "/odm/{LIB}/egl", "/odm/{LIB}",
         "/vendor/{LIB}/hw", "/vendor/{LIB}/egl", "/vendor/{LIB}"
     ]
-    _DEFAULT_PROGRAM_INTERPRETERS = [
+    _ELF_CACHE_ENV = "VTS_VNDK_DEPENDENCY_CACHE"
+    _ELF_CACHE_VERSION = 3
+    _DEFAULT_PROGRAM_INTERPRETERS = frozenset([
         "/system/bin/linker", "/system/bin/linker64"
-    ]
+    ])
 
     class ElfObject(object):
         """Contains dependencies of an ELF file on target device.
@@ -77,14 +252,18 @@ class VtsVndkDependencyTest(unittest.TestCase):
             bitness: Integer. Bitness of the ELF.
             deps: List of strings. The names of the depended libraries.
             runpaths: List of strings. The library search paths.
+            is_sp_hal: Boolean, whether the path matches same-process HAL.
         """
+        __slots__ = ("target_path", "name", "target_dir", "bitness", "deps",
+                     "runpaths", "is_sp_hal")
 
-        def __init__(self, target_path, bitness, deps, runpaths):
+        def __init__(self, target_path, bitness, deps, runpaths,
+                     is_sp_hal=False):
             self.target_path = target_path
-            self.name = target_path_module.basename(target_path)
-            self.target_dir = target_path_module.dirname(target_path)
+            self.target_dir, self.name = target_path_module.split(target_path)
             self.bitness = bitness
             self.deps = deps
+            self.is_sp_hal = is_sp_hal
             # Format runpaths
             self.runpaths = []
             lib_dir_name = "lib64" if bitness == 64 else "lib"
@@ -102,13 +281,38 @@ class VtsVndkDependencyTest(unittest.TestCase):
         self._dut = utils.AndroidDevice(serial_number)
         self.assertTrue(self._dut.IsRoot(), "This test requires adb root.")
 
+        self._abi_lists = {32: self._dut.GetCpuAbiList(32),
+                           64: self._dut.GetCpuAbiList(64)}
+        self._is_64_bit = bool(self._abi_lists[64])
+        # Keep the ABIs which are not in the lists of either bitness.
+        for abi in self._dut.GetCpuAbiList():
+            if all(abi not in x for x in self._abi_lists.values()):
+                for abi_list in self._abi_lists.values():
+                    abi_list.append(abi)
+
+        # Without the cache, the ELF files are read while being pulled.
+        self._elf_futures = {}
+        self._executor = None
+        if not os.environ.get(self._ELF_CACHE_ENV):
+            try:
+                self._executor = concurrent.futures.ProcessPoolExecutor()
+                self.addCleanup(self._executor.shutdown)
+            except (NotImplementedError, OSError) as e:
+                logging.warning("Cannot create process pool: %s", e)
+
         self._temp_dir = tempfile.mkdtemp()
+        target_dirs = []
         for target_dir in (self._TARGET_ODM_DIR, self._TARGET_VENDOR_DIR):
             if self._dut.IsDirectory(target_dir):
-                logging.info("adb pull %s %s", target_dir, self._temp_dir)
-                self._dut.AdbPull(target_dir, self._temp_dir)
+                target_dirs.append(target_dir)
             else:
                 logging.info("Skip adb pull %s", target_dir)
+        self._PullDirectories(target_dirs)
+        try:
+            self._permissions = self._dut.GetFilePermissions(target_dirs)
+        except IOError as e:
+            logging.warning("Cannot list file permissions: %s", e)
+            self._permissions = {}
 
         vndk_lists = vndk_data.LoadVndkLibraryListsFromResources(
             self._dut.GetVndkVersion(),
@@ -119,8 +323,23 @@ class VtsVndkDependencyTest(unittest.TestCase):
         self.assertTrue(vndk_lists, "Cannot load VNDK library lists.")
 
         sp_hal_strings = vndk_lists[0]
-        self._sp_hal = [re.compile(x) for x in sp_hal_strings]
-        (self._ll_ndk, self._vndk, self._vndk_sp) = vndk_lists[1:]
+        self._sp_hal = _CompileSpHalPattern(sp_hal_strings)
+        # The lists are converted to sets for fast membership tests.
+        (self._ll_ndk, self._vndk, self._vndk_sp) = (
+            frozenset(x) for x in vndk_lists[1:])
+        self._vendor_allowed = self._ll_ndk | self._vndk | self._vndk_sp
+        self._sp_hal_allowed = self._ll_ndk | self._vndk_sp
+
+        self._sp_hal_link_paths = {
+            b: [vndk_utils.FormatVndkPath(x, b) for
+                x in self._SP_HAL_LINK_PATHS] for b in (32, 64)}
+        self._vendor_link_paths = {
+            b: [vndk_utils.FormatVndkPath(x, b) for
+                x in self._VENDOR_LINK_PATHS] for b in (32, 64)}
+        self._vndk_ext_dirs = {
+            b: vndk_utils.GetVndkExtDirectories(b) for b in (32, 64)}
+        self._vndk_sp_ext_dirs = {
+            b: vndk_utils.GetVndkSpExtDirectories(b) for b in (32, 64)}
 
         logging.debug("LL_NDK: %s", self._ll_ndk)
         logging.debug("SP_HAL: %s", sp_hal_strings)
@@ -132,33 +351,116 @@ class VtsVndkDependencyTest(unittest.TestCase):
         logging.info("Delete %s", self._temp_dir)
         shutil.rmtree(self._temp_dir, ignore_errors=True)
 
-    def _IsElfObjectForAp(self, elf, target_path, abi_list):
+    def _PullDirectories(self, target_dirs):
+        """Copies directories from device to the temporary directory.
+
+        This method pulls all directories in one tar stream and extracts
+        only the ELF files. If the device fails to create the stream, this
+        method falls back to adb pull, which copies all files.
+
+        Args:
+            target_dirs: List of strings, the directories on device.
+        """
+        if not target_dirs:
+            return
+        logging.info("adb exec-out tar %s", " ".join(target_dirs))
+        try:
+            self._dut.AdbPullDirectories(
+                target_dirs, self._temp_dir, _ELF_MAGIC,
+                self._SubmitElfFile if self._executor else None)
+            return
+        except IOError as e:
+            logging.warning("Cannot pull directories in tar stream: %s", e)
+
+        for future in self._elf_futures.values():
+            future.cancel()
+        self._elf_futures.clear()
+        for target_dir in target_dirs:
+            shutil.rmtree(os.path.join(self._temp_dir, target_dir.strip("/")),
+                          ignore_errors=True)
+            logging.info("adb pull %s %s", target_dir, self._temp_dir)
+            self._dut.AdbPull(target_dir, self._temp_dir)
+
+    def _SubmitElfFile(self, full_path):
+        """Starts reading an ELF file in the process pool.
+
+        Args:
+            full_path: The path to the ELF file in _temp_dir.
+        """
+        target_path = target_path_module.join(
+            self._TARGET_ROOT_DIR,
+            *os.path.relpath(full_path, self._temp_dir).split(os.path.sep))
+        self._elf_futures[(full_path, target_path)] = self._executor.submit(
+            _ReadElfFile, full_path, target_path, self._abi_lists)
+
+    def _ReadElfFiles(self, full_paths, target_paths, abi_lists):
+        """Reads ELF files in a process pool.
+
+        The files submitted by _SubmitElfFile are not read again. The other
+        files are read in _executor if it exists.
+
+        Args:
+            full_paths: List of strings, the paths to the files on host.
+            target_paths: List of strings, the paths to the files on target.
+            abi_lists: A dict of {bitness: [abi]}, the ABIs of the ELF files to
+                       load.
+
+        Returns:
+            List of the return values of _ReadElfFile.
+        """
+        paths = list(zip(full_paths, target_paths))
+        missing = [x for x in paths if x not in self._elf_futures]
+        missing_args = (
+            [x[0] for x in missing], [x[1] for x in missing],
+            itertools.repeat(abi_lists))
+        results = {}
+        if missing and self._executor:
+            results.update(zip(missing, self._executor.map(
+                _ReadElfFile, *missing_args, chunksize=32)))
+        elif missing:
+            results.update(zip(missing, _ParallelMap(
+                _ReadElfFile, *missing_args)))
+        return [self._elf_futures[x].result() if x in self._elf_futures else
+                results[x] for x in paths]
+
+    def _IsExecutable(self, target_path):
+        """Checks whether execute permission is granted to a file on target.
+
+        Args:
+            target_path: The path to the file on target.
+
+        Returns:
+            A boolean, whether the file is executable.
+        """
+        permission = self._permissions.get(target_path)
+        if permission is None:
+            return self._dut.IsExecutable(target_path)
+        return "x" in permission
+
+    def _IsElfObjectForAp(self, elf, target_path):
         """Checks whether an ELF object is for application processor.
 
+        The ELF object is assumed to match the ABI of application processor.
+
         Args:
-            elf: The object of elf_parser.ElfParser.
+            elf: The _ElfInfo read from the ELF file.
             target_path: The path to the ELF file on target.
-            abi_list: A list of strings, the ABIs of the application processor.
 
         Returns:
             A boolean, whether the ELF object is for application processor.
         """
-        if not any(elf.MatchCpuAbi(x) for x in abi_list):
-            logging.debug("%s does not match the ABI", target_path)
-            return False
-
         # b/115567177 Skip an ELF file if it meets the following 3 conditions:
         # The ELF type is executable.
-        if not elf.IsExecutable():
+        if not elf.is_executable:
             return True
 
         # It requires special program interpreter.
-        interp = elf.GetProgramInterpreter()
+        interp = elf.interp
         if not interp or interp in self._DEFAULT_PROGRAM_INTERPRETERS:
             return True
 
         # It does not have execute permission in the file system.
-        if self._dut.IsExecutable(target_path):
+        if self._IsExecutable(target_path):
             return True
 
         return False
@@ -173,7 +475,7 @@ class VtsVndkDependencyTest(unittest.TestCase):
         created by Android build system.
 
         Args:
-            elf: The object of elf_parser.ElfParser.
+            elf: The _ElfInfo read from the ELF file.
             target_path: The path to the ELF file on target.
 
         Returns:
@@ -181,21 +483,21 @@ class VtsVndkDependencyTest(unittest.TestCase):
         """
         # b/133399940 Skip an ELF file if it does not have .note.android.ident
         # section and meets one of the following conditions:
-        if elf.HasAndroidIdent():
+        if elf.has_android_ident:
             return True
 
         # It's in the specific directory and is a shared library.
         if (target_path.startswith("/vendor/arib/lib/") and
                 ".so" in target_path and
-                elf.IsSharedObject()):
+                elf.is_shared_object):
             return False
 
         # It's in the specific directory, requires special program interpreter,
         # and is executable.
         if target_path.startswith("/vendor/arib/bin/"):
-            interp = elf.GetProgramInterpreter()
+            interp = elf.interp
             if interp and interp not in self._DEFAULT_PROGRAM_INTERPRETERS:
-                if elf.IsExecutable() or self._dut.IsExecutable(target_path):
+                if elf.is_executable or self._IsExecutable(target_path):
                     return False
 
         return True
@@ -214,108 +516,252 @@ class VtsVndkDependencyTest(unittest.TestCase):
             for file_name in file_names:
                 yield os.path.join(root_dir, file_name)
 
-    def _LoadElfObjects(self, host_dir, target_dir, abi_list,
+    def _LoadElfCache(self, abi_lists):
+        """Loads the cache of ELF file properties.
+
+        Args:
+            abi_lists: A dict of {bitness: [abi]}, the ABIs of the ELF files to
+                       load. The cache is discarded if the ABIs or the version
+                       are different, or if the file is malformed.
+
+        Returns:
+            A dict of {key: (status, value)} where key is returned by
+            _GetElfCacheKey and (status, value) is returned by _ReadElfFile.
+            None if the cache is disabled.
+        """
+        cache_path = os.environ.get(self._ELF_CACHE_ENV)
+        if not cache_path:
+            return None
+        try:
+            with open(cache_path, "r") as cache_file:
+                cache = json.load(cache_file)
+        except (IOError, OSError, ValueError) as e:
+            logging.info("Cannot load %s: %s", cache_path, e)
+            return {}
+        if (not isinstance(cache, dict) or
+                cache.get("version") != self._ELF_CACHE_VERSION):
+            logging.info("Discard %s due to different version.", cache_path)
+            return {}
+        if cache.get("abi_lists") != {str(k): v for k, v in
+                                      abi_lists.items()}:
+            logging.info("Discard %s due to different ABIs.", cache_path)
+            return {}
+        try:
+            return {key: (status,
+                          _ElfInfo(*value) if status == "ok" else value)
+                    for key, (status, value) in cache["files"].items()}
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logging.info("Discard malformed %s: %s", cache_path, e)
+            return {}
+
+    def _SaveElfCache(self, cache, abi_lists):
+        """Saves the cache of ELF file properties.
+
+        Args:
+            cache: The dict returned by _LoadElfCache.
+            abi_lists: A dict of {bitness: [abi]}, the ABIs of the ELF files.
+        """
+        cache_path = os.environ.get(self._ELF_CACHE_ENV)
+        try:
+            with open(cache_path, "w") as cache_file:
+                json.dump({"version": self._ELF_CACHE_VERSION,
+                           "abi_lists": abi_lists, "files": cache},
+                          cache_file)
+        except (IOError, OSError) as e:
+            logging.warning("Cannot save %s: %s", cache_path, e)
+
+    @staticmethod
+    def _GetElfCacheKey(full_path, target_path):
+        """Returns the key of a file in the cache of ELF file properties.
+
+        The key contains the digest of the file content. The modification
+        time is not used because images may be built with fixed timestamps.
+        """
+        digest = hashlib.sha256()
+        with open(full_path, "rb") as elf_file:
+            for chunk in iter(lambda: elf_file.read(1 << 20), b""):
+                digest.update(chunk)
+        return "%s:%s" % (target_path, digest.hexdigest())
+
+    def _LoadElfObjects(self, host_dir, target_dir, abi_lists,
                         elf_error_handler):
         """Scans a host directory recursively and loads all ELF files in it.
 
+        The files are parsed in a process pool. The checks requiring the
+        device are done in this process. If the cache is enabled, the files
+        whose paths and contents are unchanged are not parsed again.
+
         Args:
             host_dir: The host directory to scan.
             target_dir: The path from which host_dir is copied.
-            abi_list: A list of strings, the ABIs of the ELF files to load.
+            abi_lists: A dict of {bitness: [abi]}, the ABIs of the ELF files
+                       to load.
             elf_error_handler: A function that takes 2 arguments
-                               (target_path, exception). It is called when
+                               (target_path, message). It is called when
                                the parser fails to read an ELF file.
 
         Returns:
             List of ElfObject.
         """
+        # Skip formatting the messages if they are not logged.
+        log_info = logging.getLogger().isEnabledFor(logging.INFO)
+        full_paths = list(self._IterateFiles(host_dir))
+        target_paths = [
+            target_path_module.join(
+                target_dir,
+                *os.path.relpath(x, host_dir).split(os.path.sep))
+            for x in full_paths]
+
+        cache = self._LoadElfCache(abi_lists)
+        if cache is None:
+            results = self._ReadElfFiles(full_paths, target_paths, abi_lists)
+        else:
+            keys = [self._GetElfCacheKey(full_path, target_path) for
+                    full_path, target_path in zip(full_paths, target_paths)]
+            results = [cache.get(x) for x in keys]
+            missing = [i for i, x in enumerate(results) if x is None]
+            logging.info("Parse %d files. %d files are cached.",
+                         len(missing), len(results) - len(missing))
+            for i, result in zip(missing, self._ReadElfFiles(
+                    [full_paths[x] for x in missing],
+                    [target_paths[x] for x in missing], abi_lists)):
+                results[i] = result
+            self._SaveElfCache(dict(zip(keys, results)), abi_lists)
+
         objs = []
-        for full_path in self._IterateFiles(host_dir):
-            rel_path = os.path.relpath(full_path, host_dir)
-            target_path = target_path_module.join(
-                target_dir, *rel_path.split(os.path.sep))
-            try:
-                elf = elf_parser.ElfParser(full_path)
-            except elf_parser.ElfError:
+        for target_path, (status, elf) in zip(target_paths, results):
+            if status == "not_elf":
                 logging.debug("%s is not an ELF file", target_path)
                 continue
-            try:
-                if not self._IsElfObjectForAp(elf, target_path, abi_list):
+            if status == "not_abi":
+                logging.debug("%s does not match the ABI", target_path)
+                if log_info:
                     logging.info("%s is not for application processor",
                                  target_path)
-                    continue
-                if not self._IsElfObjectBuiltForAndroid(elf, target_path):
-                    logging.warning("%s is not built for Android, which is no "
-                                    "longer exempted.", target_path)
+                continue
+            if status == "error":
+                elf_error_handler(target_path, elf)
+                continue
 
-                deps, runpaths = elf.ListDependencies()
-            except elf_parser.ElfError as e:
-                elf_error_handler(target_path, e)
+            if not self._IsElfObjectForAp(elf, target_path):
+                if log_info:
+                    logging.info("%s is not for application processor",
+                                 target_path)
                 continue
-            finally:
-                elf.Close()
-
-            logging.info("%s depends on: %s", target_path, ", ".join(deps))
-            if runpaths:
-                logging.info("%s has runpaths: %s",
-                             target_path, ":".join(runpaths))
-            objs.append(self.ElfObject(target_path, elf.bitness, deps,
-                                       runpaths))
+            if elf.error is not None:
+                elf_error_handler(target_path, elf.error)
+                continue
+            if not self._IsElfObjectBuiltForAndroid(elf, target_path):
+                logging.warning("%s is not built for Android, which is "
+                                "no longer exempted.", target_path)
+
+            if log_info:
+                logging.info("%s depends on: %s",
+                             target_path, ", ".join(elf.deps))
+                if elf.runpaths:
+                    logging.info("%s has runpaths: %s",
+                                 target_path, ":".join(elf.runpaths))
+            objs.append(self.ElfObject(
+                target_path, elf.bitness, elf.deps, elf.runpaths,
+                bool(self._sp_hal.match(target_path))))
         return objs
 
-    def _FindLibsInLinkPaths(self, bitness, link_paths, objs):
+    @staticmethod
+    def _GroupElfObjects(objs):
+        """Groups ELF objects by bitness and directory.
+
+        Args:
+            objs: List of ElfObject.
+
+        Returns:
+            A dict, {bitness: {dir: [obj]}} where obj is an ElfObject, bitness
+            is obj.bitness, and dir is obj.target_dir.
+        """
+        groups = collections.defaultdict(
+            lambda: collections.defaultdict(list))
+        for obj in objs:
+            groups[obj.bitness][obj.target_dir].append(obj)
+        return groups
+
+    def _FindLibsInLinkPaths(self, link_paths, dir_objs):
         """Finds libraries in link paths.
 
         Args:
-            bitness: 32 or 64, the bitness of the returned libraries.
             link_paths: List of strings, the default link paths.
-            objs: List of ElfObject, the libraries/executables to be filtered
-                  by bitness and path.
+            dir_objs: Dict of {dir: [obj]}, the libraries/executables to be
+                      filtered by path.
 
         Returns:
             A defaultdict, {dir: {name: obj}} where obj is an ElfObject, dir
             is obj.target_dir, and name is obj.name.
         """
+        link_path_prefixes = tuple(x + self._TARGET_DIR_SEP for
+                                   x in link_paths)
         namespace = collections.defaultdict(dict)
-        for obj in objs:
-            if (obj.bitness == bitness and
-                    any(obj.target_path.startswith(link_path +
-                                                   self._TARGET_DIR_SEP)
-                        for link_path in link_paths)):
-                namespace[obj.target_dir][obj.name] = obj
+        for target_dir, objs in dir_objs.items():
+            if (target_dir + self._TARGET_DIR_SEP).startswith(
+                    link_path_prefixes):
+                for obj in objs:
+                    namespace[target_dir][obj.name] = obj
         return namespace
 
-    def _DfsDependencies(self, lib, searched, namespace, link_paths):
+    def _DfsDependencies(self, lib, searched, namespace, linkable_libs):
         """Depth-first-search for library dependencies.
 
         Args:
             lib: ElfObject, the library to search for dependencies.
             searched: The set of searched libraries.
             namespace: Defaultdict, {dir: {name: obj}} containing all
-                       searchable libraries.
+                       searchable libraries. It is used to resolve runpaths.
+            linkable_libs: Dict, {name: obj} returned by
+                           _ResolveLibsInLinkPaths.
+        """
+        stack = [lib]
+        while stack:
+            lib = stack.pop()
+            if lib in searched:
+                continue
+            searched.add(lib)
+            for dep_name in lib.deps:
+                dep = None
+                for runpath in lib.runpaths:
+                    dep = namespace.get(runpath, {}).get(dep_name)
+                    if dep is not None:
+                        break
+                else:
+                    dep = linkable_libs.get(dep_name)
+                if dep is not None and dep not in searched:
+                    stack.append(dep)
+
+    @staticmethod
+    def _ResolveLibsInLinkPaths(namespace, link_paths):
+        """Resolves library names in link paths.
+
+        Args:
+            namespace: Defaultdict, {dir: {name: obj}} containing all libraries
+                       in the linker namespace.
             link_paths: List of strings, the default link paths.
+
+        Returns:
+            A dict, {name: obj} where obj is the ElfObject found first in the
+            link paths.
         """
-        if lib in searched:
-            return
-        searched.add(lib)
-        for dep_name in lib.deps:
-            for link_path in lib.runpaths + link_paths:
-                if dep_name in namespace[link_path]:
-                    self._DfsDependencies(namespace[link_path][dep_name],
-                                          searched, namespace, link_paths)
-                    break
-
-    def _FindDisallowedDependencies(self, objs, namespace, link_paths,
-                                    *vndk_lists):
+        linkable_libs = {}
+        for link_path in reversed(link_paths):
+            linkable_libs.update(namespace.get(link_path, {}))
+        return linkable_libs
+
+    def _FindDisallowedDependencies(self, objs, namespace, allowed_names):
         """Tests if libraries/executables have disallowed dependencies.
 
         Args:
             objs: Collection of ElfObject, the libraries/executables under
                   test.
             namespace: Defaultdict, {dir: {name: obj}} containing all libraries
-                       in the linker namespace.
-            link_paths: List of strings, the default link paths.
-            vndk_lists: Collections of library names in VNDK, VNDK-SP, etc.
+                       in the linker namespace. It is used to resolve the
+                       runpaths.
+            allowed_names: Set of strings, the union of library names in
+                           VNDK, VNDK-SP, default link paths, etc.
 
         Returns:
             List of tuples (path, disallowed_dependencies).
@@ -324,10 +770,10 @@ class VtsVndkDependencyTest(unittest.TestCase):
         for obj in objs:
             disallowed_libs = []
             for dep_name in obj.deps:
-                if any((dep_name in vndk_list) for vndk_list in vndk_lists):
+                if dep_name in allowed_names:
                     continue
-                if any((dep_name in namespace[link_path]) for link_path in
-                       obj.runpaths + link_paths):
+                if any((dep_name in namespace.get(runpath, ())) for runpath in
+                       obj.runpaths):
                     continue
                 disallowed_libs.append(dep_name)
 
@@ -335,69 +781,93 @@ class VtsVndkDependencyTest(unittest.TestCase):
                 dep_errors.append((obj.target_path, disallowed_libs))
         return dep_errors
 
-    def _TestElfDependency(self, bitness, objs):
+    def _TestElfDependency(self, bitness, dir_objs):
         """Tests vendor libraries/executables and SP-HAL dependencies.
 
         Args:
             bitness: 32 or 64, the bitness of the vendor libraries.
-            objs: List of ElfObject. The libraries/executables in odm and
-                  vendor partitions.
+            dir_objs: Dict of {dir: [obj]}. The libraries/executables of the
+                      bitness in odm and vendor partitions.
 
         Returns:
             List of tuples (path, disallowed_dependencies).
         """
-        vndk_sp_ext_dirs = vndk_utils.GetVndkSpExtDirectories(bitness)
-
-        vendor_link_paths = [vndk_utils.FormatVndkPath(x, bitness) for
-                             x in self._VENDOR_LINK_PATHS]
-        vendor_namespace = self._FindLibsInLinkPaths(bitness,
-                                                     vendor_link_paths, objs)
+        vndk_sp_ext_dirs = self._vndk_sp_ext_dirs[bitness]
+
+        vendor_link_paths = self._vendor_link_paths[bitness]
+        sp_hal_link_paths = self._sp_hal_link_paths[bitness]
+        # The link paths of vendor processes and same-process HAL share most
+        # directories. Scan the objects once for both.
+        sp_hal_namespace = self._FindLibsInLinkPaths(
+            sorted(set(vendor_link_paths) | set(sp_hal_link_paths)),
+            dir_objs)
+        vendor_namespace = collections.defaultdict(dict, sp_hal_namespace)
         # Exclude VNDK and VNDK-SP extensions from vendor libraries.
-        for vndk_ext_dir in (vndk_utils.GetVndkExtDirectories(bitness) +
-                             vndk_utils.GetVndkSpExtDirectories(bitness)):
+        for vndk_ext_dir in (self._vndk_ext_dirs[bitness] +
+                             vndk_sp_ext_dirs):
             vendor_namespace.pop(vndk_ext_dir, None)
-        logging.info("%d-bit odm, vendor, and SP-HAL libraries:", bitness)
-        for dir_path, libs in vendor_namespace.items():
-            logging.info("%s: %s", dir_path, ",".join(libs.keys()))
+        log_info = logging.getLogger().isEnabledFor(logging.INFO)
+        if log_info:
+            logging.info("%d-bit odm, vendor, and SP-HAL libraries:", bitness)
+            for dir_path, libs in vendor_namespace.items():
+                logging.info("%s: %s", dir_path, ",".join(libs.keys()))
 
-        sp_hal_link_paths = [vndk_utils.FormatVndkPath(x, bitness) for
-                             x in self._SP_HAL_LINK_PATHS]
-        sp_hal_namespace = self._FindLibsInLinkPaths(bitness,
-                                                     sp_hal_link_paths, objs)
+        sp_hal_linkable_libs = self._ResolveLibsInLinkPaths(
+            sp_hal_namespace, sp_hal_link_paths)
 
         # Find same-process HAL and dependencies
+        sp_hal_roots = [obj for link_path in sp_hal_link_paths for
+                        obj in sp_hal_namespace.get(link_path, {}).values() if
+                        obj.is_sp_hal]
         sp_hal_libs = set()
-        for link_path in sp_hal_link_paths:
-            for obj in sp_hal_namespace[link_path].values():
-                if any(x.match(obj.target_path) for x in self._sp_hal):
-                    self._DfsDependencies(obj, sp_hal_libs, sp_hal_namespace,
-                                          sp_hal_link_paths)
-        logging.info("%d-bit SP-HAL libraries: %s",
-                     bitness, ", ".join(x.name for x in sp_hal_libs))
+        for obj in sp_hal_roots:
+            self._DfsDependencies(obj, sp_hal_libs, sp_hal_namespace,
+                                  sp_hal_linkable_libs)
+        if log_info:
+            logging.info("%d-bit SP-HAL libraries: %s",
+                         bitness, ", ".join(x.name for x in sp_hal_libs))
 
         # Find VNDK-SP extension libraries and their dependencies.
-        vndk_sp_ext_libs = set(obj for obj in objs if
-                               obj.bitness == bitness and
-                               obj.target_dir in vndk_sp_ext_dirs)
+        vndk_sp_ext_libs = set(obj for x in vndk_sp_ext_dirs for
+                               obj in dir_objs.get(x, ()))
         vndk_sp_ext_deps = set()
         for lib in vndk_sp_ext_libs:
             self._DfsDependencies(lib, vndk_sp_ext_deps, sp_hal_namespace,
-                                  sp_hal_link_paths)
-        logging.info("%d-bit VNDK-SP extension libraries and dependencies: %s",
-                     bitness, ", ".join(x.name for x in vndk_sp_ext_deps))
+                                  sp_hal_linkable_libs)
+        if log_info:
+            logging.info("%d-bit VNDK-SP extension libraries and "
+                         "dependencies: %s",
+                         bitness, ", ".join(x.name for x in vndk_sp_ext_deps))
+
+        # The library names that the objects are allowed to depend on, except
+        # for the libraries in runpaths.
+        vendor_lib_names = frozenset(self._ResolveLibsInLinkPaths(
+            vendor_namespace, vendor_link_paths))
+        vendor_allowed_names = self._vendor_allowed | vendor_lib_names
+        vndk_sp_ext_allowed_names = self._sp_hal_allowed | vendor_lib_names
+        sp_hal_allowed_names = self._sp_hal_allowed.union(
+            sp_hal_linkable_libs)
+
+        # Classify the objects in one pass. vndk_sp_ext_deps and sp_hal_libs
+        # may overlap. Their dependency restrictions are the same.
+        vendor_objs = []
+        vndk_sp_ext_objs = []
+        for objs in dir_objs.values():
+            for obj in objs:
+                if obj in sp_hal_libs:
+                    continue
+                if obj in vndk_sp_ext_deps:
+                    vndk_sp_ext_objs.append(obj)
+                else:
+                    vendor_objs.append(obj)
 
         # A vendor library/executable is allowed to depend on
         # LL-NDK
         # VNDK
         # VNDK-SP
         # Other libraries in vendor link paths
-        vendor_objs = {obj for obj in objs if
-                       obj.bitness == bitness and
-                       obj not in sp_hal_libs and
-                       obj not in vndk_sp_ext_deps}
         dep_errors = self._FindDisallowedDependencies(
-            vendor_objs, vendor_namespace, vendor_link_paths,
-            self._ll_ndk, self._vndk, self._vndk_sp)
+            vendor_objs, vendor_namespace, vendor_allowed_names)
 
         # A VNDK-SP extension library/dependency is allowed to depend on
         # LL-NDK
@@ -407,12 +877,8 @@ class VtsVndkDependencyTest(unittest.TestCase):
         #
         # However, it is not allowed to indirectly depend on VNDK. i.e., the
         # depended vendor libraries must not depend on VNDK.
-        #
-        # vndk_sp_ext_deps and sp_hal_libs may overlap. Their dependency
-        # restrictions are the same.
         dep_errors.extend(self._FindDisallowedDependencies(
-            vndk_sp_ext_deps - sp_hal_libs, vendor_namespace,
-            vendor_link_paths, self._ll_ndk, self._vndk_sp))
+            vndk_sp_ext_objs, vendor_namespace, vndk_sp_ext_allowed_names))
 
         if not vndk_utils.IsVndkRuntimeEnforced(self._dut):
             logging.warning("Ignore dependency errors: %s", dep_errors)
@@ -423,21 +889,21 @@ class VtsVndkDependencyTest(unittest.TestCase):
         # VNDK-SP
         # Other same-process HAL libraries and dependencies
         dep_errors.extend(self._FindDisallowedDependencies(
-            sp_hal_libs, sp_hal_namespace, sp_hal_link_paths,
-            self._ll_ndk, self._vndk_sp))
+            sp_hal_libs, sp_hal_namespace, sp_hal_allowed_names))
         return dep_errors
 
     def testElfDependency(self):
         """Tests vendor libraries/executables and SP-HAL dependencies."""
         read_errors = []
-        abi_list = self._dut.GetCpuAbiList()
         objs = self._LoadElfObjects(
-            self._temp_dir, self._TARGET_ROOT_DIR, abi_list,
+            self._temp_dir, self._TARGET_ROOT_DIR, self._abi_lists,
             lambda p, e: read_errors.append((p, str(e))))
 
-        dep_errors = self._TestElfDependency(32, objs)
-        if self._dut.GetCpuAbiList(64):
-            dep_errors.extend(self._TestElfDependency(64, objs))
+        objs_by_bitness = self._GroupElfObjects(objs)
+        dep_errors = self._TestElfDependency(32, objs_by_bitness[32])
+        if self._is_64_bit:
+            dep_errors.extend(self._TestElfDependency(64,
+                                                      objs_by_bitness[64]))
 
         assert_lines = []
         if read_errors:
@@ -16,6 +16,7 @@
 #
 
 import argparse
+import multiprocessing
 import os
 import subprocess
 import sys
@@ -117,9 +118,33 @@ def _LoadLibraryNames(file_names):
     return lib_names
 
 
+def _DumpLibraryAbi(args):
+    """Generates an ABI dump from a library lsdump.
+
+    This function is called in a worker process of DumpAbi.
+
+    Args:
+        args: A tuple of (dump_path, lib_lsdump_path), the paths to the output
+              dump file and the input lsdump.
+
+    Returns:
+        A tuple of (success, messages). success is a boolean, whether the
+        ABI dump is created. messages is a list of strings to be printed.
+    """
+    dump_path, lib_lsdump_path = args
+    try:
+        extract_lsdump.ParseLsdumpFile(lib_lsdump_path, dump_path)
+    except extract_lsdump.LsdumpError as e:
+        return False, [lib_lsdump_path, str(e), '']
+    return True, [lib_lsdump_path, 'Output: ' + dump_path, '']
+
+
 def DumpAbi(output_dir, lib_names, lsdump_path):
     """Generates ABI dumps from library lsdumps.
 
+    The lsdumps are parsed in a process pool. The messages are printed in
+    the order of lib_names.
+
     Args:
         output_dir: The output directory of dump files.
         lib_names: The names of the libraries to dump.
@@ -128,22 +153,32 @@ def DumpAbi(output_dir, lib_names, lsdump_path):
     Returns:
         A list of strings, the libraries whose ABI dump fails to be created.
     """
-    missing_dumps = []
+    tasks = []
     for lib_name in lib_names:
         dump_path = os.path.join(output_dir, lib_name + '.abi.dump')
         lib_lsdump_path = os.path.join(lsdump_path, lib_name + '.lsdump')
         if os.path.isfile(lib_lsdump_path + '.gz'):
             lib_lsdump_path += '.gz'
+        tasks.append((dump_path, lib_lsdump_path))
 
-        print(lib_lsdump_path)
-        try:
-            extract_lsdump.ParseLsdumpFile(lib_lsdump_path, dump_path)
-        except extract_lsdump.LsdumpError as e:
-            missing_dumps.append(lib_name)
-            print(e)
-        else:
-            print('Output: ' + dump_path)
-        print('')
+    # Create the output directories before the workers write to them
+    # concurrently.
+    for dump_dir in set(os.path.dirname(x[0]) for x in tasks):
+        if dump_dir and not os.path.isdir(dump_dir):
+            os.makedirs(dump_dir)
+
+    missing_dumps = []
+    pool = multiprocessing.Pool()
+    try:
+        for lib_name, (success, messages) in zip(
+                lib_names, pool.imap(_DumpLibraryAbi, tasks)):
+            if not success:
+                missing_dumps.append(lib_name)
+            for message in messages:
+                print(message)
+    finally:
+        pool.close()
+        pool.join()
     return missing_dumps
 
 
@@ -262,6 +297,9 @@ def main():
                              target_2nd_arch,
                              target_2nd_arch_variant))
 
+    # The library names are the same for all targets.
+    lib_names = _LoadLibraryNames(args.file)
+
     for target_tuple in dump_targets:
         (platform_vndk_version,
          binder_bitness,
@@ -294,8 +332,6 @@ def main():
             'lib64' if abi_bitness == '64' else 'lib')
         print("OUTPUT_DIR=" + output_dir)
 
-        lib_names = _LoadLibraryNames(args.file)
-
         missing_dumps = DumpAbi(output_dir, lib_names, lsdump_path)
 
         if missing_dumps:
@@ -16,6 +16,7 @@
 #
 
 import argparse
+import errno
 import gzip
 import json
 import os
@@ -81,6 +82,35 @@ def _OpenFileOrGzipped(file_name):
     return open(file_name, 'rb')
 
 
+def _OpenOutputFile(file_name):
+    """Opens a file for writing and creates the parent directory if needed.
+
+    The directory is created only if the file cannot be opened, so that the
+    existence of the directory is not checked for every file.
+
+    Args:
+        file_name: The file name to open.
+
+    Returns:
+        A file object.
+
+    Raises:
+        IOError or OSError if fails to create the directory or open the file.
+    """
+    try:
+        return open(file_name, 'wb')
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)))
+    except OSError as e:
+        # The directory may be created by another process.
+        if e.errno != errno.EEXIST:
+            raise
+    return open(file_name, 'wb')
+
+
 def _ConsumeOffset(tok, beg=0):
     """Consumes a <offset-number> in a thunk symbol."""
     pos = tok.find('_', beg) + 1
@@ -150,19 +180,20 @@ def _FilterElfFunctions(lsdump):
             yield elf_function
 
 
-def _FilterElfObjects(lsdump):
+def _FilterElfObjects(lsdump, type_symbols):
     """Finds exported variables, type info, and vtables in lsdump.
 
     Args:
         lsdump: An AttrDict object containing the lsdump.
+        type_symbols: A list of strings, the _GetTypeSymbol results of
+                      lsdump.record_types.
 
     Yields:
         The AttrDict objects in lsdump.elf_objects.
     """
     global_vars = {global_var.linker_set_key
                    for global_var in lsdump.global_vars}
-    record_names = {_GetTypeSymbol(record_type)[len('_ZTI'):]
-                    for record_type in lsdump.record_types}
+    record_names = {type_symbol[len('_ZTI'):] for type_symbol in type_symbols}
 
     for elf_object in lsdump.elf_objects:
         name = elf_object.name
@@ -173,30 +204,34 @@ def _FilterElfObjects(lsdump):
             yield elf_object
 
 
-def _ParseSymbolsFromLsdump(lsdump, output_dump):
+def _ParseSymbolsFromLsdump(lsdump, type_symbols, output_dump):
     """Parses symbols from an lsdump.
 
     Args:
         lsdump: An AttrDict object containing the lsdump.
+        type_symbols: A list of strings, the _GetTypeSymbol results of
+                      lsdump.record_types.
         output_dump: An AttrDict object containing the output.
     """
     output_dump.elf_functions = list(_FilterElfFunctions(lsdump))
-    output_dump.elf_objects = list(_FilterElfObjects(lsdump))
+    output_dump.elf_objects = list(_FilterElfObjects(lsdump, type_symbols))
 
 
-def _ParseVtablesFromLsdump(lsdump, output_dump):
+def _ParseVtablesFromLsdump(lsdump, type_symbols, output_dump):
     """Parses vtables from an lsdump.
 
     Args:
         lsdump: An AttrDict object containing the lsdump.
+        type_symbols: A list of strings, the _GetTypeSymbol results of
+                      lsdump.record_types.
         output_dump: An AttrDict object containing the output.
     """
     vtable_symbols = {elf_object.name for elf_object in lsdump.elf_objects
                       if elf_object.name.startswith('_ZTV')}
 
     output_dump.record_types = []
-    for lsdump_record_type in lsdump.record_types:
-        type_symbol = _GetTypeSymbol(lsdump_record_type)
+    for type_symbol, lsdump_record_type in zip(type_symbols,
+                                               lsdump.record_types):
         vtable_symbol = '_ZTV' + type_symbol[len('_ZTI'):]
         if vtable_symbol not in vtable_symbols:
             continue
@@ -224,9 +259,18 @@ def _ParseLsdumpFileObject(lsdump_file):
         raise LsdumpError(e)
 
     try:
+        # The type symbols are shared by vtable and symbol parsing. If the
+        # library exports no type info or vtables, e.g., a C library, none of
+        # the record types is dumped.
+        if any(elf_object.name.startswith('_ZT')
+               for elf_object in lsdump.elf_objects):
+            type_symbols = [_GetTypeSymbol(record_type)
+                            for record_type in lsdump.record_types]
+        else:
+            type_symbols = []
         output_dump = AttrDict()
-        _ParseVtablesFromLsdump(lsdump, output_dump)
-        _ParseSymbolsFromLsdump(lsdump, output_dump)
+        _ParseVtablesFromLsdump(lsdump, type_symbols, output_dump)
+        _ParseSymbolsFromLsdump(lsdump, type_symbols, output_dump)
         return output_dump
     except AttributeError as e:
         raise LsdumpError(e)
@@ -253,18 +297,14 @@ def ParseLsdumpFile(input_path, output_path):
     Raises:
         LsdumpError if fails to create the dump file.
     """
-    abs_output_path = os.path.abspath(output_path)
-    abs_output_dir = os.path.dirname(abs_output_path)
-
     try:
-        if abs_output_dir and not os.path.exists(abs_output_dir):
-            os.makedirs(abs_output_dir)
-
         with _OpenFileOrGzipped(input_path) as lsdump_file:
             output_dump = _ParseLsdumpFileObject(lsdump_file)
-        with open(output_path, 'wb') as output_file:
-            json.dump(output_dump, output_file,
-                      indent=1, separators=(',', ':'))
+        # writelines consumes the chunks without calling write per chunk in
+        # python code, and does not join them into one string.
+        encoder = json.JSONEncoder(indent=1, separators=(',', ':'))
+        with _OpenOutputFile(output_path) as output_file:
+            output_file.writelines(encoder.iterencode(output_dump))
     except (IOError, OSError) as e:
         raise LsdumpError(e)
 
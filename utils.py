@@ -21,7 +21,10 @@
 import gzip
 import logging
 import os
+import posixpath
+import shutil
 import subprocess
+import tarfile
 import tempfile
 
 class AndroidDevice(object):
@@ -35,6 +38,110 @@ class AndroidDevice(object):
         subprocess.check_call(cmd, shell=False, stdin=subprocess.PIPE,
                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
+    def AdbPullDirectories(self, src_dirs, dst, file_magic=None,
+                           file_handler=None):
+        """Copies directories from device in one tar stream.
+
+        Compared with AdbPull, this method does not send one adb sync request
+        per file. It is much faster for directories containing many small
+        files. Like AdbPull, symbolic links are followed and copied as
+        regular files. Special files are ignored. The modification time of
+        the regular files is preserved.
+
+        Args:
+            src_dirs: Strings, the absolute paths to the directories on device.
+            dst: A string, the directory on host to which the source
+                 directories are copied.
+            file_magic: Bytes. If specified, only the regular files starting
+                        with the bytes are extracted.
+            file_handler: A function that takes the host path as the
+                          argument. If specified, it is called after each
+                          regular file is extracted.
+
+        Raises:
+            IOError if the tar stream cannot be read, or tar reports any
+            error, e.g., an unreadable file or a dangling symbolic link.
+        """
+        def _ToHostPath(name):
+            names = [x for x in name.split("/") if x and x != "."]
+            if not names or ".." in names:
+                return None
+            return os.path.join(dst, *names)
+
+        # adb exec-out does not return the exit status of the command. tar
+        # writes its stderr and exit status to a file on device, which is
+        # read after the stream ends.
+        err_path = "/data/local/tmp/adb_pull_directories_%d.txt" % os.getpid()
+        # -h makes tar follow the symbolic links. The trailing separators make
+        # tar follow the links to the source directories, e.g.,
+        # /odm -> /vendor/odm.
+        tar_cmd = "cd / && tar -chf - %s 2>%s; echo $? >>%s" % (
+            " ".join(x.strip("/") + "/" for x in src_dirs), err_path,
+            err_path)
+        cmd = ["adb", "-s", self._serial_number, "exec-out", tar_cmd]
+        proc = subprocess.Popen(cmd, shell=False, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            with tarfile.open(fileobj=proc.stdout, mode="r|") as tar_file:
+                for member in tar_file:
+                    host_path = _ToHostPath(member.name)
+                    if host_path is None:
+                        continue
+                    if member.isdir():
+                        if not os.path.isdir(host_path):
+                            os.makedirs(host_path)
+                        continue
+                    if member.isreg():
+                        src_file = tar_file.extractfile(member)
+                        head = b""
+                        if file_magic:
+                            head = src_file.read(len(file_magic))
+                            if head != file_magic:
+                                continue
+                        host_dir = os.path.dirname(host_path)
+                        if not os.path.isdir(host_dir):
+                            os.makedirs(host_dir)
+                        with open(host_path, "wb") as host_file:
+                            host_file.write(head)
+                            shutil.copyfileobj(src_file, host_file)
+                    elif member.islnk():
+                        # A hard link refers to a file earlier in the stream.
+                        # The file is absent if it is filtered by file_magic.
+                        link_path = _ToHostPath(member.linkname)
+                        if link_path is None or not os.path.isfile(link_path):
+                            continue
+                        host_dir = os.path.dirname(host_path)
+                        if not os.path.isdir(host_dir):
+                            os.makedirs(host_dir)
+                        shutil.copyfile(link_path, host_path)
+                    else:
+                        continue
+                    os.utime(host_path, (member.mtime, member.mtime))
+                    if file_handler:
+                        file_handler(host_path)
+        except tarfile.TarError as e:
+            proc.kill()
+            raise IOError("`%s` cannot be extracted: %s" % (tar_cmd, e))
+        except BaseException:
+            # file_handler may start processes which inherit stdout. Closing
+            # stdout in this process does not stop adb, so kill it before
+            # waiting.
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            err = proc.stderr.read()
+            proc.wait()
+        if proc.returncode != 0:
+            raise IOError("`%s` stderr: %s" % (" ".join(cmd), err))
+
+        out, err, return_code = self.Execute("cat", err_path, ";",
+                                             "rm", "-f", err_path)
+        # The output is tar's stderr followed by the exit status.
+        if return_code != 0 or err.strip() or out.strip() != "0":
+            raise IOError("`%s` stderr and exit status: %s\n"
+                          "`cat %s` stderr: %s" % (tar_cmd, out, err_path, err))
+
     def Execute(self, *args):
         """Executes a command.
 
@@ -57,6 +164,45 @@ class AndroidDevice(object):
             err = err.decode("utf-8")
         return out, err, proc.returncode
 
+    def _ExecuteLines(self, *args):
+        """Executes a command and reads stdout line by line.
+
+        Compared with Execute, this method does not hold the whole stdout in
+        memory. It is suitable for the commands with large output.
+
+        Args:
+            args: Strings, the arguments.
+
+        Yields:
+            Strings, the lines in stdout without line separators.
+
+        Raises:
+            IOError if the command writes to stderr or fails.
+        """
+        cmd = ["adb", "-s", self._serial_number, "shell"]
+        cmd.extend(args)
+        # stderr is redirected to a file so that the command is not blocked
+        # by a full pipe while stdout is being read.
+        with tempfile.TemporaryFile() as err_file:
+            proc = subprocess.Popen(cmd, shell=False, stdin=subprocess.PIPE,
+                                    stdout=subprocess.PIPE, stderr=err_file)
+            try:
+                for line in proc.stdout:
+                    # Compatible with python2 and python3
+                    if not isinstance(line, str):
+                        line = line.decode("utf-8")
+                    yield line.rstrip("\r\n")
+            finally:
+                proc.stdout.close()
+                proc.wait()
+            err_file.seek(0)
+            err = err_file.read()
+            if not isinstance(err, str):
+                err = err.decode("utf-8")
+        if proc.returncode != 0 or err.strip():
+            raise IOError("`%s` return code: %d\nstderr: %s" %
+                          (" ".join(args), proc.returncode, err))
+
     def _GetProp(self, name):
         """Gets an Android system property.
 
@@ -224,6 +370,37 @@ class AndroidDevice(object):
         """Returns if execute permission is granted to a path on the device."""
         return "x" in self._Stat("%A", path)
 
+    def GetFilePermissions(self, dir_paths):
+        """Gets the permissions of the regular files in directories.
+
+        This method executes one command for all files, while IsExecutable
+        executes one command per file.
+
+        Args:
+            dir_paths: Strings, the paths to the directories on the device.
+
+        Returns:
+            A dict of {path: permission} where permission is a string in the
+            format of `ls -l`, e.g., "-rwxr-xr-x".
+
+        Raises:
+            IOError if the command fails.
+        """
+        if not dir_paths:
+            return {}
+        # The trailing separators make find follow the symbolic links to the
+        # directories.
+        args = [x.rstrip("/") + "/" for x in dir_paths]
+        permissions = {}
+        for line in self._ExecuteLines(
+                "find", *(args + ["-type", "f", "-exec", "stat", "--format",
+                                  "'%A %n'", "{}", "+"])):
+            if not line.strip():
+                continue
+            permission, _, path = line.partition(" ")
+            permissions[posixpath.normpath(path)] = permission
+        return permissions
+
     def FindFiles(self, path, name_pattern, *options):
         """Executes find command.
 